@@ -4,12 +4,44 @@ Class: Explorations of Place and Space - Networks
 Date: October 2021
 """
 
+import importlib.util
 import random
-import statistics
 
-import networkx as nx
-from networkx import Graph, degree_centrality, closeness_centrality, betweenness_centrality, eigenvector_centrality, \
-    clustering
+import numpy as np
+
+# Numba compiles the simulation kernels below to native code. Without it the kernels are None and NetworkAnalysis
+# uses its vectorized NumPy methods instead.
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = None
+
+# The Cython extension built from network_analysis_sim.pyx runs the random and degree trials in C when Numba is not
+# installed.
+try:
+    import network_analysis_sim
+except ImportError:
+    network_analysis_sim = None
+
+# NetworkX is only imported inside the methods that need it, so runs that never build a NetworkX graph, such as the
+# random and degree measures, do not pay for loading it.
+
+# igraph computes centrality in C and is much faster than NetworkX. NetworkX is used when it is not installed.
+try:
+    import igraph
+except ImportError:
+    igraph = None
+
+# SciPy measures closeness and eigenvector centrality straight from the CSR arrays without building a graph.
+try:
+    from scipy.sparse import csgraph, csr_matrix
+except ImportError:
+    csr_matrix = None
+
+# graphblas_algorithms computes centrality with the SuiteSparse:GraphBLAS kernels. It is an optional dependency that
+# is only imported once USE_GRAPHBLAS routes a measure through it.
+GRAPHBLAS_INSTALLED = importlib.util.find_spec("graphblas_algorithms") is not None
 
 NODE_COUNT = 10  # The number of nodes in the network.
 EDGE_PROBABILITY = 0.5  # The probability that an edge will exist when the network is created.
@@ -25,14 +57,33 @@ CENTRALITIES = ["random", "degree", "closeness", "clustering", "betweenness", "e
 # Use this to only test one measure of centrality.
 # CENTRALITIES = ["degree"]
 
+# Measures of centrality that can be computed in native code. All of their networks are simulated in parallel across
+# numba.get_num_threads() threads, which can be set with the NUMBA_NUM_THREADS environment variable.
+# Each measure maps to the fixed ID that pick_immune understands, so entries can be removed without changing the others.
+JIT_CENTRALITIES = {"random": 0, "degree": 1}
+
+# Set this to True to measure GRAPHBLAS_CENTRALITIES with graphblas_algorithms when it is installed. It pays off for
+# large values of NODE_COUNT, where the all-pairs shortest paths behind closeness dominate the run time.
+USE_GRAPHBLAS = False
+GRAPHBLAS_CENTRALITIES = ["closeness"]
+
 
 def main() -> None:
     results = []
     for i in CENTRALITIES:
         print(i + ":")
-        data = number_infected(NETWORK_COUNT, DAYS_TO_RUN, i)
-        results.append(i + ": avg=" + str(statistics.mean(data)) + ", med=" + str(statistics.median(data)) +
-                       ", mode=" + str(statistics.mode(data)) + ", stdev=" + str(statistics.stdev(data)))
+        histogram = number_infected(NETWORK_COUNT, DAYS_TO_RUN, i)
+
+        # Every statistic is derived from the histogram, where histogram[k] networks ended with k infected nodes.
+        counts = np.arange(histogram.size)
+        networks = histogram.sum()
+        mean = (counts * histogram).sum() / networks
+        cumulative = np.cumsum(histogram)
+        median = (np.searchsorted(cumulative, (networks - 1) // 2, side="right") +
+                  np.searchsorted(cumulative, networks // 2, side="right")) / 2
+        stdev = np.sqrt(((counts - mean) ** 2 * histogram).sum() / (networks - 1))
+        results.append(i + ": avg=" + str(mean) + ", med=" + str(median) +
+                       ", mode=" + str(histogram.argmax()) + ", stdev=" + str(stdev))
 
     print("\nNetworks = " + str(NETWORK_COUNT) +
           ", Days = " + str(DAYS_TO_RUN) + ", Nodes = " + str(NODE_COUNT) +
@@ -41,142 +92,639 @@ def main() -> None:
         print(i)
 
     # analysis = NetworkAnalysis(NODE_COUNT)
-    # analysis.generate_new_network(NODE_COUNT, "degree")
+    # analysis.generate_new_network("degree")
     # analysis.print_edges(True)
     # analysis.print_immune()
     # print(analysis.spread_infection_for_n_days(4))
 
 
-def number_infected(networks: int, days: int, centrality: str) -> list:
+def number_infected(networks: int, days: int, centrality: str) -> np.ndarray:
     """
     This method runs the simulation for the inputted number of days, analysing the certain centrality that
     is inputted. It creates a network, spreads the infection, and stores the number infected for the number of networks
-    that the user enters. It prints its progress every 10,000 networks that are generated and analyzed.
+    that the user enters, tallying them by the number of infected nodes. It prints its progress every 10,000 networks
+    that are generated and analyzed, or before and after the native trials, which analyze every network in one call.
     :param networks: The number of networks to analyze.
     :param days: The number of days the infection should spread.
     :param centrality: The type of centrality that should be measured in order to immunize the node of highest importance.
-    :return: A list of integers that represents the number of infected individuals after n days for each network.
+    :return: A histogram where the value at index k is the number of networks with k infected individuals after n days.
     """
-    total = []
+    if centrality in JIT_CENTRALITIES and native_trials is not None:
+        print("Progress: 0")
+        total = native_trials(networks, NODE_COUNT, days, EDGE_PROBABILITY, INFECTION_RATE,
+                              JIT_CENTRALITIES[centrality])
+        print("Progress: " + str(networks))
+        return np.bincount(total, minlength=NODE_COUNT + 1)
+
+    histogram = np.zeros(NODE_COUNT + 1, dtype=np.int64)
     analysis = NetworkAnalysis(NODE_COUNT, centrality)
     for i in range(networks):
         if i % 10000 == 0:
             print("Progress: " + str(i))
-        analysis.generate_new_network(NODE_COUNT, centrality)
-        total.append(analysis.spread_infection_for_n_days(days))
+        analysis.generate_new_network(centrality)
+        histogram[analysis.spread_infection_for_n_days(days)] += 1
+    return histogram
+
+
+def jit(signature: str, parallel: bool = False):
+    """
+    Compiles a simulation kernel to native code with Numba. Without Numba the kernel is replaced with None, just like
+    the other optional dependencies, so that it is never run as plain Python.
+    :param signature: The Numba type signature of the kernel.
+    :param parallel: If true, the prange loops in the kernel are spread across threads.
+    :return: A decorator for the kernel.
+    """
+    if njit is None:
+        return lambda function: None
+    return njit(signature, parallel=parallel, cache=True)
+
+
+@jit("int64(int32[:], int32[:], int32[:], int32[:], float64)")
+def fill_csr(indptr: np.ndarray, indices: np.ndarray, sources: np.ndarray, targets: np.ndarray,
+             edgeProbability: float) -> int:
+    """
+    Overwrites the CSR arrays with a new binomial network in native code, then writes each edge into the rows of both
+    of its nodes. Sparse networks are sampled with the Batagelj-Brandes method, which draws the geometric gap to the
+    next edge instead of flipping a coin for every pair of nodes.
+    :param indptr: The CSR row pointers to fill, one longer than the number of nodes.
+    :param indices: The CSR column indices to fill, with room for an edge between every pair of nodes in both rows.
+    :param sources: Scratch space for the first node of every possible edge.
+    :param targets: Scratch space for the second node of every possible edge.
+    :param edgeProbability: The probability that an edge will exist between any two nodes.
+    :return: The number of edges in the network.
+    """
+    nodeCount = indptr.size - 1
+
+    # The degree of node i is counted at indptr[i + 2] so that the prefix sum below leaves the start of row i at
+    # indptr[i + 1], which then advances to the end of the row while the edges are placed.
+    indptr[:] = 0
+    edgeCount = 0
+    if 0.0 < edgeProbability < 0.5:
+        # Walks the pairs (j, i) with j < i in row-major order, skipping straight to the next edge each draw.
+        logMiss = np.log1p(-edgeProbability)
+        i = 1
+        j = -1
+        while i < nodeCount:
+            gap = np.log(1.0 - np.random.random()) / logMiss
+            # A gap past the last pair ends the network, which also keeps tiny probabilities from overflowing j.
+            if gap >= nodeCount * nodeCount:
+                break
+            j += 1 + int(gap)
+            while j >= i and i < nodeCount:
+                j -= i
+                i += 1
+            if i < nodeCount:
+                sources[edgeCount] = j
+                targets[edgeCount] = i
+                if i + 2 <= nodeCount:
+                    indptr[i + 2] += 1
+                indptr[j + 2] += 1
+                edgeCount += 1
+    else:
+        # Dense networks have an edge for most pairs, so one coin per pair is cheaper than computing the gaps. At a
+        # probability of one half each coin is a single random bit, so 64 pairs share one draw.
+        halfChance = edgeProbability == 0.5
+        bits = np.uint64(0)
+        bitsLeft = 0
+        for i in range(nodeCount):
+            for j in range(i + 1, nodeCount):
+                if halfChance:
+                    if bitsLeft == 0:
+                        bits = random.getrandbits(64)
+                        bitsLeft = 64
+                    hit = (bits & np.uint64(1)) != 0
+                    bits >>= np.uint64(1)
+                    bitsLeft -= 1
+                else:
+                    hit = np.random.random() < edgeProbability
+                if hit:
+                    sources[edgeCount] = i
+                    targets[edgeCount] = j
+                    indptr[i + 2] += 1
+                    if j + 2 <= nodeCount:
+                        indptr[j + 2] += 1
+                    edgeCount += 1
+
+    for i in range(2, nodeCount + 1):
+        indptr[i] += indptr[i - 1]
+
+    # Edges were sampled in sorted order, so filling each row from its start keeps the neighbors sorted.
+    for k in range(edgeCount):
+        indices[indptr[sources[k] + 1]] = targets[k]
+        indptr[sources[k] + 1] += 1
+        indices[indptr[targets[k] + 1]] = sources[k]
+        indptr[targets[k] + 1] += 1
+    return edgeCount
+
+
+@jit("Tuple((int32[:], int32[:]))(int64, float64)")
+def build_csr(nodeCount: int, edgeProbability: float) -> tuple:
+    """
+    Creates the CSR arrays of a new binomial network in native code.
+    :param nodeCount: The number of nodes in the network.
+    :param edgeProbability: The probability that an edge will exist between any two nodes.
+    :return: The (indptr, indices) pair describing the network.
+    """
+    pairCount = nodeCount * (nodeCount - 1) // 2
+    indptr = np.empty(nodeCount + 1, dtype=np.int32)
+    indices = np.empty(2 * pairCount, dtype=np.int32)
+    edgeCount = fill_csr(indptr, indices, np.empty(pairCount, dtype=np.int32), np.empty(pairCount, dtype=np.int32),
+                         edgeProbability)
+    return indptr, indices[:2 * edgeCount]
+
+
+@jit("void(int32[:], int32[:], int64)")
+def isolate_node(indptr: np.ndarray, indices: np.ndarray, node: int):
+    """
+    Removes every edge of a node from the CSR arrays in place, leaving its row empty. Isolating the immune node means
+    the infection can never reach it, so spreading the infection needs no immunity check.
+    :param indptr: The CSR row pointers of the network.
+    :param indices: The CSR column indices of the network.
+    :param node: The index of the node to isolate.
+    """
+    kept = 0
+    start = indptr[0]
+    for i in range(indptr.size - 1):
+        end = indptr[i + 1]
+        if i != node:
+            for k in range(start, end):
+                if indices[k] != node:
+                    indices[kept] = indices[k]
+                    kept += 1
+        start = end
+        indptr[i + 1] = kept
+
+
+@jit("int64(int32[:], int32[:], boolean[:], boolean[:], int64, float64)")
+def simulate(indptr: np.ndarray, indices: np.ndarray, infected: np.ndarray, updated: np.ndarray, days: int,
+             infectionRate: float) -> int:
+    """
+    Spreads the infection for a certain number of days in native code. The infected array is updated in place.
+    :param indptr: The CSR row pointers of the network, with the immune node isolated.
+    :param indices: The CSR column indices of the network.
+    :param infected: Boolean array of the nodes that are infected before the first day.
+    :param updated: Scratch buffer the same size as infected that holds the next day's infections.
+    :param days: The number of days the infection spreads.
+    :param infectionRate: The probability that the infection will spread along each edge each day.
+    :return: The number of infected nodes after the infection is done spreading.
+    """
+    updated[:] = infected
+    for day in range(days):
+        for i in range(infected.size):
+            if infected[i]:
+                for k in range(indptr[i], indptr[i + 1]):
+                    if np.random.random() < infectionRate:
+                        updated[indices[k]] = True
+        infected[:] = updated
+
+    total_infected = 0
+    for i in range(infected.size):
+        if infected[i]:
+            total_infected += 1
+    return total_infected
+
+
+@jit("int64(int32[:], int32[:], int64)")
+def pick_immune(indptr: np.ndarray, indices: np.ndarray, centralityId: int) -> int:
+    """
+    Chooses the node to immunize in native code. If several nodes are tied for the highest degree, a random node from
+    the list of leaders is selected.
+    :param indptr: The CSR row pointers of the network.
+    :param indices: The CSR column indices of the network.
+    :param centralityId: The ID in JIT_CENTRALITIES of the measure of importance to use: 0 for random, 1 for degree.
+    :return: The index of the node to immunize.
+    """
+    nodeCount = indptr.size - 1
+    if centralityId == 0:
+        return np.random.randint(nodeCount)
+
+    maxDegree = -1
+    leaders = 0
+    chosen = 0
+    for i in range(nodeCount):
+        degree = indptr[i + 1] - indptr[i]
+        if degree > maxDegree:
+            maxDegree = degree
+            leaders = 0
+        if degree == maxDegree:
+            # Reservoir sampling keeps every leader equally likely to be chosen without storing the list.
+            leaders += 1
+            if np.random.randint(leaders) == 0:
+                chosen = i
+    return chosen
+
+
+@jit("int64[:](int64, int64, int64, float64, float64, int64)", parallel=True)
+def run_trials(networks: int, nodeCount: int, days: int, edgeProbability: float, infectionRate: float,
+               centralityId: int) -> np.ndarray:
+    """
+    Runs the whole simulation for every network in native code, spreading the networks across threads.
+    :param networks: The number of networks to analyze.
+    :param nodeCount: The number of nodes in each network.
+    :param days: The number of days the infection should spread.
+    :param edgeProbability: The probability that an edge will exist between any two nodes.
+    :param infectionRate: The probability that the infection will spread along each edge each day.
+    :param centralityId: The ID in JIT_CENTRALITIES of the measure of importance to use: 0 for random, 1 for degree.
+    :return: An array that holds the number of infected individuals after n days for each network.
+    """
+    total = np.empty(networks, dtype=np.int64)
+    for t in prange(networks):
+        indptr, indices = build_csr(nodeCount, edgeProbability)
+        immune = pick_immune(indptr, indices, centralityId)
+        isolate_node(indptr, indices, immune)
+
+        # Makes one random node that is not immune have a True infected state, shifting past the immune node.
+        infected = np.zeros(nodeCount, dtype=np.bool_)
+        infected[(immune + 1 + np.random.randint(nodeCount - 1)) % nodeCount] = True
+
+        total[t] = simulate(indptr, indices, infected, np.empty(nodeCount, dtype=np.bool_), days, infectionRate)
     return total
 
 
-class NetworkAnalysis:
-    network: Graph  # The network itself that holds edge information.
-    infectionMatrix: list  # Keeps track of which nodes are infected.
-    immune: int  # The value of this is the index of the node that is immune.
+@jit("void(int64)")
+def seed_kernels(seed: int):
+    """
+    Seeds the random number generators used inside the native kernels, which are separate from NumPy's and Python's.
+    :param seed: The seed for the generators.
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+
+
+# The random and degree trials run in Numba, or in the Cython extension when only that is available. Without either,
+# number_infected runs them through NetworkAnalysis.
+native_trials = run_trials if run_trials is not None else getattr(network_analysis_sim, "run_trials", None)
 
-    def __init__(self, nodeCount, centrality):
-        self.generate_new_network(nodeCount, centrality)
 
-    def generate_new_network(self, nodeCount: int, immuneType: str):
+def argmax_random_tiebreak(scores: np.ndarray, rng: np.random.Generator) -> int:
+    """
+    Finds the most important node. If several nodes are tied for importance, a random node from the list of leaders
+    is selected.
+    :param scores: Array holding the importance of each node, indexed by node.
+    :param rng: The generator that breaks ties.
+    :return: The index of the chosen node.
+    """
+    # Nodes with the same importance can differ in the last bits of a floating point score, so near ties count as ties.
+    candidates = np.flatnonzero(np.isclose(scores, scores.max(), rtol=1e-9, atol=1e-12))
+    return int(candidates[rng.integers(candidates.size)])
+
+
+def closeness_from_distances(others: np.ndarray, totals: np.ndarray, nodeCount: int) -> np.ndarray:
+    """
+    Computes the closeness centrality of every node in the same way as NetworkX. Only reachable nodes count towards
+    the distance, scaled by the fraction of the network that is reachable.
+    :param others: The number of other nodes that each node can reach.
+    :param totals: The sum of the shortest path lengths from each node to the nodes it can reach.
+    :param nodeCount: The number of nodes in the network.
+    :return: An array holding the closeness of each node, indexed by node.
+    """
+    scores = np.zeros(nodeCount)
+    connected = totals > 0
+    scores[connected] = others[connected] ** 2 / (totals[connected] * max(nodeCount - 1, 1))
+    return scores
+
+
+def eigenvector_power_iteration(multiply, nodeCount: int) -> np.ndarray:
+    """
+    Computes the eigenvector centrality of every node with power iteration on A + I, which converges to the same vector
+    as A but cannot oscillate on bipartite networks. It runs until the scores settle, so nodes of equal importance end
+    up with scores that compare as ties.
+    :param multiply: A function that multiplies an array of scores by the adjacency matrix.
+    :param nodeCount: The number of nodes in the network.
+    :return: An array holding the eigenvector centrality of each node, indexed by node.
+    """
+    scores = np.ones(nodeCount) / np.sqrt(nodeCount)
+    for i in range(1000):
+        previous = scores
+        scores = scores + multiply(scores)
+        scores /= np.linalg.norm(scores)
+        if np.abs(scores - previous).max() < 1e-13:
+            break
+    return scores
+
+
+class NetworkAnalysis:
+    indptr: np.ndarray  # CSR row pointers; the neighbors of node i are indices[indptr[i]:indptr[i + 1]].
+    indices: np.ndarray  # CSR column indices holding the neighbors of every node, row by row, sized for a full network.
+    edgeSources: np.ndarray  # Scratch space for the first node of each edge while the network is generated.
+    edgeTargets: np.ndarray  # Scratch space for the second node of each edge while the network is generated.
+    pairRows: np.ndarray  # The lower node of every pair of nodes, in row-major order.
+    pairColumns: np.ndarray  # The higher node of every pair of nodes, in the same order as pairRows.
+    infectionMatrix: np.ndarray  # Boolean array that keeps track of which nodes are infected.
+    nextInfectionMatrix: np.ndarray  # Second buffer that spread_infection fills before swapping it with the first.
+    immune: int  # The value of this is the index of the node that is immune.
+    immuneNeighbors: np.ndarray  # The neighbors the immune node had before its edges were removed, sized for all nodes.
+    immuneDegree: int  # The number of neighbors the immune node had before its edges were removed.
+    rng: np.random.Generator  # PCG64 generator that draws every random number outside of the native kernels.
+    randomTape: np.ndarray  # Buffer that spread_infection fills with one random number per CSR index each day.
+
+    def __init__(self, nodeCount, centrality, seed=None):
+        # A seed makes every network and infection reproducible, including those made inside the native kernels. Only
+        # the Numba kernels keep their own generators, so the process-wide NumPy and Python generators are left alone
+        # without Numba.
+        self.rng = np.random.default_rng(seed)
+        if seed is not None and seed_kernels is not None:
+            seed_kernels(seed)
+
+        # Every buffer is allocated once here and refilled in place for each new network.
+        pairCount = nodeCount * (nodeCount - 1) // 2
+        self.randomTape = np.empty(2 * pairCount)
+        self.indptr = np.empty(nodeCount + 1, dtype=np.int32)
+        self.indices = np.empty(2 * pairCount, dtype=np.int32)
+        self.edgeSources = np.empty(pairCount, dtype=np.int32)
+        self.edgeTargets = np.empty(pairCount, dtype=np.int32)
+        self.pairRows, self.pairColumns = np.triu_indices(nodeCount, k=1)
+        self.infectionMatrix = np.zeros(nodeCount, dtype=bool)
+        self.nextInfectionMatrix = np.zeros(nodeCount, dtype=bool)
+        self.immuneNeighbors = np.empty(nodeCount, dtype=np.int32)
+        self.generate_new_network(centrality)
+
+    def generate_new_network(self, immuneType: str):
         """
-        Creates a new binomial network with nodeCount number of nodes and with immuneType being the measure of importance
-        to determine immunity. Edges are created, a node is immunized, and a node is infected.
-        :param nodeCount: The number of nodes in the network.
+        Creates a new binomial network with the number of nodes given to the constructor and with immuneType being the
+        measure of importance to determine immunity. Edges are created, a node is immunized, and a node is infected.
         :param immuneType: The measure of importance to determine which node to immunize.
         """
-        network = nx.Graph()
-
-        # Initializes the infectionMatrix list so every node is not infected with a value of False.
-        self.infectionMatrix = []
-        for i in range(0, nodeCount):
-            self.infectionMatrix.append(False)
+        # Resets the infectionMatrix array so every node is not infected with a value of False.
+        self.infectionMatrix.fill(False)
 
         self.immune = -1
-
-        # Adds the correct number of nodes to the graph.
-        for i in range(nodeCount):
-            network.add_node(i)
+        self.immuneDegree = 0
 
         # Randomly adds edges between nodes based on the probability of an edge being created.
-        for i in range(len(network.nodes)):
-            for j in range(i + 1, len(network.nodes)):
-                if (random.random() < EDGE_PROBABILITY):
-                    network.add_edge(i, j)
-        self.network = network
+        self.fill_network()
 
         self.immunize_node(immuneType)
 
+        # The immune node's edges are removed once here rather than checked for every edge while spreading. Its
+        # neighbors are kept so that the edges can still be listed.
+        start, end = self.indptr[self.immune], self.indptr[self.immune + 1]
+        self.immuneDegree = end - start
+        self.immuneNeighbors[:self.immuneDegree] = self.indices[start:end]
+        self.isolate(self.immune)
+
         # Makes one random node have a True infected state.
         self.infect_random_node()
 
+    def fill_csr_native(self):
+        """
+        Overwrites the CSR arrays with a new binomial network using the fill_csr kernel.
+        """
+        fill_csr(self.indptr, self.indices, self.edgeSources, self.edgeTargets, EDGE_PROBABILITY)
+
+    def fill_csr_vectorized(self):
+        """
+        Overwrites the CSR arrays with a new binomial network using NumPy. Only the pairs that become edges are kept,
+        and the degree of every node is counted with bincount, so no adjacency matrix is ever built.
+        """
+        keep = self.rng.random(self.pairRows.size) < EDGE_PROBABILITY
+        rows, columns = self.pairRows[keep], self.pairColumns[keep]
+
+        # Listing each edge from its higher node first keeps the neighbors of every node sorted after a stable sort.
+        sources = np.concatenate((columns, rows))
+        targets = np.concatenate((rows, columns))
+        order = np.argsort(sources, kind="stable")
+
+        self.indptr[0] = 0
+        np.cumsum(np.bincount(sources, minlength=self.indptr.size - 1), out=self.indptr[1:])
+        self.indices[:targets.size] = targets[order]
+
+    def isolate_node_native(self, node: int):
+        """
+        Removes every edge of a node from the CSR arrays in place using the isolate_node kernel, leaving its row empty.
+        :param node: The index of the node to isolate.
+        """
+        isolate_node(self.indptr, self.indices, node)
+
+    def isolate_node_vectorized(self, node: int):
+        """
+        Removes every edge of a node from the CSR arrays in place using NumPy, leaving its row empty.
+        :param node: The index of the node to isolate.
+        """
+        # Every neighbor of the node loses exactly one entry, and the node loses its whole row.
+        start, end = self.indptr[node], self.indptr[node + 1]
+        degrees = np.diff(self.indptr)
+        degrees[self.indices[start:end]] -= 1
+        degrees[node] = 0
+
+        kept = np.concatenate((self.indices[:start], self.indices[end:self.indptr[-1]]))
+        kept = kept[kept != node]
+        np.cumsum(degrees, out=self.indptr[1:])
+        self.indices[:kept.size] = kept
+
+    # The kernels are None without Numba, so the vectorized NumPy methods are used in their place.
+    fill_network = fill_csr_native if fill_csr is not None else fill_csr_vectorized
+    isolate = isolate_node_native if isolate_node is not None else isolate_node_vectorized
+
     def immunize_node(self, immuneType: str):
         """
         Immunizes a node based on the inputted degree. If several nodes are tied for importance,
         a random node from the list of leaders is selected.
         :param immuneType: The measure of importance to measure to immunize a node.
         """
+        # The random and degree measures are read straight from the CSR arrays without building a graph.
         if immuneType == "degree":
-            dictionary = degree_centrality(self.network)
-        elif immuneType == "closeness":
-            dictionary = closeness_centrality(self.network)
+            self.immune = argmax_random_tiebreak(np.diff(self.indptr), self.rng)
+            return
+        elif immuneType not in ("closeness", "clustering", "betweenness", "eigenvector"):
+            self.immune = int(self.rng.integers(len(self.infectionMatrix)))
+            return
+
+        scores = None
+        if USE_GRAPHBLAS and GRAPHBLAS_INSTALLED and immuneType in GRAPHBLAS_CENTRALITIES:
+            scores = self.graphblas_centrality(immuneType)
+
+        if scores is None:
+            if csr_matrix is not None and immuneType in ("closeness", "eigenvector"):
+                scores = self.scipy_centrality(immuneType)
+            elif immuneType == "eigenvector":
+                # igraph and NetworkX pick different leaders on disconnected networks, so the power iteration is used.
+                scores = self.eigenvector_centrality_vectorized()
+            elif igraph is not None:
+                scores = self.igraph_centrality(immuneType)
+            else:
+                scores = self.networkx_centrality(immuneType)
+
+        # Isolated nodes have an undefined closeness in igraph, so they are treated as having no importance.
+        self.immune = argmax_random_tiebreak(np.nan_to_num(np.asarray(scores, dtype=np.float64)), self.rng)
+
+    def scipy_centrality(self, immuneType: str) -> np.ndarray:
+        """
+        Measures the closeness or eigenvector centrality of every node with SciPy sparse matrices. Both match the
+        values NetworkX computes for the same measure.
+        :param immuneType: The measure of importance to compute, either closeness or eigenvector.
+        :return: An array holding the importance of each node, indexed by node.
+        """
+        nodeCount = len(self.indptr) - 1
+        edgeCount = self.indptr[-1]
+        adjacency = csr_matrix((np.ones(edgeCount), self.indices[:edgeCount], self.indptr),
+                               shape=(nodeCount, nodeCount))
+
+        if immuneType == "closeness":
+            distances = csgraph.shortest_path(adjacency, directed=False, unweighted=True)
+            reachable = np.isfinite(distances)
+            return closeness_from_distances(reachable.sum(axis=1) - 1, np.where(reachable, distances, 0).sum(axis=1),
+                                            nodeCount)
+
+        return eigenvector_power_iteration(lambda scores: adjacency @ scores, nodeCount)
+
+    def eigenvector_centrality_vectorized(self) -> np.ndarray:
+        """
+        Measures the eigenvector centrality of every node using NumPy, with the same power iteration as the SciPy
+        version. Each product with the adjacency matrix sums the scores of every node's neighbors with bincount.
+        :return: An array holding the eigenvector centrality of each node, indexed by node.
+        """
+        nodeCount = len(self.indptr) - 1
+        rows = np.repeat(np.arange(nodeCount), np.diff(self.indptr))
+        neighbors = self.indices[:self.indptr[-1]]
+        return eigenvector_power_iteration(
+            lambda scores: np.bincount(rows, weights=scores[neighbors], minlength=nodeCount), nodeCount)
+
+    def graphblas_centrality(self, immuneType: str) -> np.ndarray:
+        """
+        Measures the closeness centrality of every node with graphblas_algorithms, building the GraphBLAS matrix
+        straight from the CSR arrays. The shortest path lengths between every pair of nodes come from its breadth-first
+        search kernel.
+        :param immuneType: The measure of importance to compute. Only closeness is supported.
+        :return: An array holding the importance of each node, indexed by node, or None if graphblas_algorithms cannot
+        be imported.
+        """
+        global GRAPHBLAS_INSTALLED
+        try:
+            import graphblas
+            import graphblas_algorithms
+        except ImportError:
+            # The package can be present without a working SuiteSparse:GraphBLAS library. It is not tried again, and
+            # the other backends are used from now on.
+            GRAPHBLAS_INSTALLED = False
+            return None
+
+        nodeCount = len(self.indptr) - 1
+        adjacency = graphblas.Matrix.from_csr(self.indptr, self.indices[:self.indptr[-1]], 1.0, nrows=nodeCount,
+                                              ncols=nodeCount)
+        # The distance matrix only stores the pairs that are reachable, including each node and itself.
+        distances = graphblas_algorithms.all_pairs_shortest_path_length(graphblas_algorithms.Graph(adjacency))
+        others = distances.reduce_rowwise(graphblas.agg.count).new().to_dense(fill_value=1) - 1
+        totals = distances.reduce_rowwise(graphblas.monoid.plus).new().to_dense(fill_value=0)
+        return closeness_from_distances(others, totals, nodeCount)
+
+    def igraph_centrality(self, immuneType: str) -> list:
+        """
+        Measures the importance of every node with igraph.
+        :param immuneType: The measure of importance to compute.
+        :return: A list holding the importance of each node, indexed by node.
+        """
+        nodeCount = len(self.indptr) - 1
+        graph = igraph.Graph(n=nodeCount, edges=self.edges(), directed=False)
+        if immuneType == "closeness":
+            # igraph only averages over the reachable nodes, so the result is scaled by the fraction of the network
+            # that is reachable to match NetworkX on disconnected networks.
+            components = graph.connected_components()
+            reachable = np.asarray(components.sizes())[components.membership]
+            return np.asarray(graph.closeness()) * (reachable - 1) / max(nodeCount - 1, 1)
         elif immuneType == "clustering":
-            dictionary = clustering(self.network)
+            return graph.transitivity_local_undirected(mode="zero")
+        return graph.betweenness()
+
+    def networkx_centrality(self, immuneType: str) -> np.ndarray:
+        """
+        Measures the importance of every node with NetworkX.
+        :param immuneType: The measure of importance to compute.
+        :return: An array holding the importance of each node, indexed by node.
+        """
+        import networkx as nx
+
+        network = self.to_graph()
+        if immuneType == "closeness":
+            dictionary = nx.closeness_centrality(network)
+        elif immuneType == "clustering":
+            dictionary = nx.clustering(network)
         elif immuneType == "betweenness":
-            dictionary = betweenness_centrality(self.network)
-        elif immuneType == "eigenvector":
-            dictionary = eigenvector_centrality(self.network)
+            dictionary = nx.betweenness_centrality(network)
         else:
-            immune = random.randrange(len(self.infectionMatrix))
-            return
+            dictionary = nx.eigenvector_centrality(network)
+        # The nodes were added in order, so the dictionary already lists their importance by index.
+        return np.fromiter(dictionary.values(), dtype=np.float64, count=len(dictionary))
 
-        nodes = []
-        max = -1
-        for i in dictionary:
-            if dictionary[i] > max:
-                max = dictionary[i]
-                nodes.clear()
-            if dictionary[i] >= max:
-                nodes.append(i)
-        self.immune = nodes[random.randrange(len(nodes))]
+    def to_graph(self) -> "networkx.Graph":
+        """
+        Builds a NetworkX graph from the CSR arrays. This is only needed when a NetworkX centrality is measured.
+        :return: An undirected graph with the same nodes and edges as the network.
+        """
+        import networkx as nx
+
+        network = nx.Graph()
+        network.add_nodes_from(range(len(self.indptr) - 1))
+        network.add_edges_from(self.edges())
+        return network
+
+    def edges(self) -> list:
+        """
+        Lists every edge in the network once, as a (lower index, higher index) pair. The immune node's edges are
+        listed too, even though they have been removed from the CSR arrays.
+        :return: A list of tuples holding the two nodes of each edge.
+        """
+        edges = []
+        for i in range(len(self.indptr) - 1):
+            for j in self.indices[self.indptr[i]:self.indptr[i + 1]]:
+                if i < j:
+                    edges.append((i, int(j)))
+        if self.immuneDegree > 0:
+            for j in self.immuneNeighbors[:self.immuneDegree]:
+                edges.append((min(self.immune, int(j)), max(self.immune, int(j))))
+            edges.sort()
+        return edges
 
     def infect_random_node(self):
         """
-        Infects a random node in the matrix, ensuring it does not infect an immune node.
+        Infects a random node in the matrix, ensuring it does not infect an immune node. One of the other nodes is
+        drawn directly by shifting past the immune node, so no draw is ever rejected.
         """
-        current_node = random.randrange(len(self.infectionMatrix))
-        while current_node == self.immune:
-            current_node = random.randrange(len(self.infectionMatrix))
+        nodeCount = len(self.infectionMatrix)
+        current_node = (self.immune + 1 + self.rng.integers(nodeCount - 1)) % nodeCount
         self.infectionMatrix[current_node] = True
 
-    def spread_infection_for_n_days(self, days: int) -> int:
+    def simulate_native(self, days: int) -> int:
         """
-        Spreads the infection for a certain number of days.
+        Spreads the infection for a certain number of days using the simulate kernel.
+        :param days: The number of days the infection spreads.
+        :return: The number of infected nodes after the infection is done spreading.
+        """
+        return simulate(self.indptr, self.indices, self.infectionMatrix, self.nextInfectionMatrix, days,
+                        INFECTION_RATE)
+
+    def simulate_vectorized(self, days: int) -> int:
+        """
+        Spreads the infection for a certain number of days, running the vectorized spread_infection step each day.
         :param days: The number of days the infection spreads.
         :return: The number of infected nodes after the infection is done spreading.
         """
         for i in range(days):
             self.spread_infection()
-        total_infected = 0
-        for i in range(len(self.infectionMatrix)):
-            if self.infectionMatrix[i]:
-                total_infected += 1
-        return total_infected
+        return int(self.infectionMatrix.sum())
+
+    spread_infection_for_n_days = simulate_native if simulate is not None else simulate_vectorized
 
     def spread_infection(self):
         """
-        Causes the infection to spread along each edge with a probability of INFECTION_RATE.
+        Causes the infection to spread along each edge with a probability of INFECTION_RATE. One random number is
+        drawn for every entry of the CSR indices at the start of the day, so the neighbors of each infected node and
+        the numbers that decide its edges are both views of the same slice.
         """
-        updated_list = self.infectionMatrix.copy()
-        for i in range(len(self.infectionMatrix)):
-            if self.infectionMatrix[i]:
-                for j in list(self.network.neighbors(i)):
-                    if random.random() < INFECTION_RATE and j != self.immune:
-                        updated_list[j] = True
-        self.infectionMatrix = updated_list
+        tape = self.rng.random(out=self.randomTape[:self.indptr[-1]])
+        updated = self.nextInfectionMatrix
+        updated[:] = self.infectionMatrix
+        for i in np.flatnonzero(self.infectionMatrix):
+            start, end = self.indptr[i], self.indptr[i + 1]
+            neighbors = self.indices[start:end]
+            updated[neighbors[tape[start:end] < INFECTION_RATE]] = True
+        self.infectionMatrix, self.nextInfectionMatrix = updated, self.infectionMatrix
 
     def print_network(self):
         """
         Prints each node in the network.
         """
-        for i in list(self.network.nodes):
+        for i in range(len(self.indptr) - 1):
             print(i, end=", ")
         print()
 
@@ -186,11 +734,12 @@ class NetworkAnalysis:
         :param printEdgeInfo: If true, every edge combination will be printed.
         :return:
         """
-        print("Number of Edges: " + str(len(self.network.edges)), end=" ")
+        edges = self.edges()
+        print("Number of Edges: " + str(len(edges)), end=" ")
         if (not printEdgeInfo):
             print()
             return
-        for i in list(self.network.edges):
+        for i in edges:
             print(i, end=", ")
         print()
 
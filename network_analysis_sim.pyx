@@ -0,0 +1,203 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Cython version of the random and degree trials in NetworkAnalysis.py, for machines that cannot install Numba. Build it
+next to NetworkAnalysis.py with "cythonize -i network_analysis_sim.pyx"; add the compiler's OpenMP flag (e.g. -fopenmp)
+to run the networks in parallel. NetworkAnalysis uses it automatically when Numba is missing.
+"""
+
+import random
+
+import numpy as np
+
+from cython.parallel cimport parallel, prange, threadid
+from libc.stdlib cimport free, malloc
+
+
+cdef unsigned long long _splitmix64(unsigned long long x) noexcept nogil:
+    """
+    Mixes a 64-bit value with the SplitMix64 finalizer, so nearby inputs give unrelated outputs.
+    """
+    x += 0x9E3779B97F4A7C15ULL
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9ULL
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EBULL
+    return x ^ (x >> 31)
+
+
+cdef double _random_double(unsigned long long *state) noexcept nogil:
+    """
+    Draws a random double in [0, 1) from a SplitMix64 generator. Each thread keeps its own state, so it is safe to call
+    without the GIL, and it needs nothing from the C library, so the extension builds with any compiler.
+    """
+    cdef unsigned long long x = _splitmix64(state[0])
+    state[0] += 0x9E3779B97F4A7C15ULL
+    return (x >> 11) * (1.0 / 9007199254740992.0)
+
+
+cdef int _random_index(int count, unsigned long long *state) noexcept nogil:
+    """
+    Chooses a random integer in [0, count).
+    """
+    return <int>(_random_double(state) * count)
+
+
+cdef int _fill_csr(int nodeCount, double edgeProbability, int *indptr, int *indices, int *sources, int *targets,
+                   unsigned long long *state) noexcept nogil:
+    """
+    Overwrites the CSR arrays with a new binomial network, flipping a coin for every pair of nodes. The degree of node
+    i is counted at indptr[i + 2] so that the prefix sum leaves the start of row i at indptr[i + 1], which then
+    advances to the end of the row while the edges are placed.
+    :return: The number of edges in the network.
+    """
+    cdef int i, j, k
+    cdef int edgeCount = 0
+    for i in range(nodeCount + 1):
+        indptr[i] = 0
+    for i in range(nodeCount):
+        for j in range(i + 1, nodeCount):
+            if _random_double(state) < edgeProbability:
+                sources[edgeCount] = i
+                targets[edgeCount] = j
+                indptr[i + 2] += 1
+                if j + 2 <= nodeCount:
+                    indptr[j + 2] += 1
+                edgeCount += 1
+
+    for i in range(2, nodeCount + 1):
+        indptr[i] += indptr[i - 1]
+
+    # Edges were sampled in sorted order, so filling each row from its start keeps the neighbors sorted.
+    for k in range(edgeCount):
+        indices[indptr[sources[k] + 1]] = targets[k]
+        indptr[sources[k] + 1] += 1
+        indices[indptr[targets[k] + 1]] = sources[k]
+        indptr[targets[k] + 1] += 1
+    return edgeCount
+
+
+cdef int _pick_immune(int nodeCount, int *indptr, int centralityId, unsigned long long *state) noexcept nogil:
+    """
+    Chooses the node to immunize. If several nodes are tied for the highest degree, a random node from the list of
+    leaders is selected.
+    :return: The index of the node to immunize.
+    """
+    cdef int i, degree
+    cdef int maxDegree = -1
+    cdef int leaders = 0
+    cdef int chosen = 0
+    if centralityId == 0:
+        return _random_index(nodeCount, state)
+
+    for i in range(nodeCount):
+        degree = indptr[i + 1] - indptr[i]
+        if degree > maxDegree:
+            maxDegree = degree
+            leaders = 0
+        if degree == maxDegree:
+            # Reservoir sampling keeps every leader equally likely to be chosen without storing the list.
+            leaders += 1
+            if _random_index(leaders, state) == 0:
+                chosen = i
+    return chosen
+
+
+cdef void _isolate_node(int nodeCount, int *indptr, int *indices, int node) noexcept nogil:
+    """
+    Removes every edge of a node from the CSR arrays in place, leaving its row empty.
+    """
+    cdef int i, k, end
+    cdef int kept = 0
+    cdef int start = indptr[0]
+    for i in range(nodeCount):
+        end = indptr[i + 1]
+        if i != node:
+            for k in range(start, end):
+                if indices[k] != node:
+                    indices[kept] = indices[k]
+                    kept += 1
+        start = end
+        indptr[i + 1] = kept
+
+
+cdef long long _simulate(int nodeCount, int *indptr, int *indices, unsigned char *infected, unsigned char *updated,
+                         int days, double infectionRate, unsigned long long *state) noexcept nogil:
+    """
+    Spreads the infection for a certain number of days over a network whose immune node is isolated. The infected
+    array is updated in place.
+    :return: The number of infected nodes after the infection is done spreading.
+    """
+    cdef int day, i, k
+    cdef long long totalInfected = 0
+    for i in range(nodeCount):
+        updated[i] = infected[i]
+    for day in range(days):
+        for i in range(nodeCount):
+            if infected[i]:
+                for k in range(indptr[i], indptr[i + 1]):
+                    if _random_double(state) < infectionRate:
+                        updated[indices[k]] = 1
+        for i in range(nodeCount):
+            infected[i] = updated[i]
+
+    for i in range(nodeCount):
+        totalInfected += infected[i]
+    return totalInfected
+
+
+def run_trials(long long networks, int nodeCount, int days, double edgeProbability, double infectionRate,
+               int centralityId):
+    """
+    Runs the whole simulation for every network in C without the GIL, spreading the networks across threads.
+    :param networks: The number of networks to analyze.
+    :param nodeCount: The number of nodes in each network.
+    :param days: The number of days the infection should spread.
+    :param edgeProbability: The probability that an edge will exist between any two nodes.
+    :param infectionRate: The probability that the infection will spread along each edge each day.
+    :param centralityId: The ID in JIT_CENTRALITIES of the measure of importance to use: 0 for random, 1 for degree.
+    :return: An array that holds the number of infected individuals after n days for each network.
+    """
+    total = np.empty(networks, dtype=np.int64)
+    cdef long long[::1] totalView = total
+    cdef unsigned long long seed = random.getrandbits(64)
+    cdef int pairCount = nodeCount * (nodeCount - 1) // 2
+    cdef long long t
+    cdef int i, immune
+    cdef int *indptr
+    cdef int *indices
+    cdef int *sources
+    cdef int *targets
+    cdef unsigned char *infected
+    cdef unsigned char *updated
+    cdef unsigned long long *state
+
+    with nogil, parallel():
+        # Every thread owns its buffers and random state, which are reused for all of its networks.
+        indptr = <int *> malloc((nodeCount + 1) * sizeof(int))
+        indices = <int *> malloc((2 * pairCount + 1) * sizeof(int))
+        sources = <int *> malloc((pairCount + 1) * sizeof(int))
+        targets = <int *> malloc((pairCount + 1) * sizeof(int))
+        infected = <unsigned char *> malloc(nodeCount * sizeof(unsigned char))
+        updated = <unsigned char *> malloc(nodeCount * sizeof(unsigned char))
+        state = <unsigned long long *> malloc(sizeof(unsigned long long))
+        # The state of each thread comes from a mixed seed, so the threads start far apart in the sequence.
+        state[0] = _splitmix64(seed + threadid())
+
+        for t in prange(networks, schedule="static"):
+            _fill_csr(nodeCount, edgeProbability, indptr, indices, sources, targets, state)
+            immune = _pick_immune(nodeCount, indptr, centralityId, state)
+            _isolate_node(nodeCount, indptr, indices, immune)
+
+            # Makes one random node that is not immune have a True infected state, shifting past the immune node.
+            for i in range(nodeCount):
+                infected[i] = 0
+            infected[(immune + 1 + _random_index(nodeCount - 1, state)) % nodeCount] = 1
+
+            totalView[t] = _simulate(nodeCount, indptr, indices, infected, updated, days, infectionRate, state)
+
+        free(indptr)
+        free(indices)
+        free(sources)
+        free(targets)
+        free(infected)
+        free(updated)
+        free(state)
+    return total